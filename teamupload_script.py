@@ -1,23 +1,114 @@
+import asyncio
+import json
+import logging
+import random
 import elabapi_python
+import httpx
 import pandas as pd
+import pandera as pa
 import os
+from aiolimiter import AsyncLimiter
 from dotenv import load_dotenv
-from elabapi_python.rest import ApiException
+from functools import lru_cache
+from logging.handlers import QueueHandler, QueueListener
+from queue import Queue
+from types import SimpleNamespace
+
+logger = logging.getLogger("teamupload")
+_listener = None
+_handler = None
+
+# Expected columns of the userlist after mapping the column titles
+USERLIST_SCHEMA = pa.DataFrameSchema(
+    {
+        "email": pa.Column(str, pa.Check.str_matches(r"^[^@\s]+@[^@\s]+\.[^@\s]+$")),
+        "team": pa.Column(str),
+        "teamgroup": pa.Column(str, nullable=True),
+        "firstname": pa.Column(str, nullable=True),
+        "lastname": pa.Column(str, nullable=True),
+    },
+    name="userlist",
+)
+
+
+@lru_cache(maxsize=1)
+def read_settings() -> SimpleNamespace:
+    """
+    Loads the environment variables once per process
+
+    :return Settings with api_key and host
+    """
+    load_dotenv()
+
+    return SimpleNamespace(
+        api_key=os.environ.get("ELAB_API_KEY"),
+        host=os.environ.get("ELAB_API_HOST_URL"),
+    )
+
+
+def setup_logging() -> QueueListener:
+    """
+    Log to the console through a queue, so logging calls only enqueue the record
+    and the output is written by a separate thread. Calling it again returns the
+    running listener instead of adding another handler.
+
+    :return Started listener, call stop_logging() at the end to flush the remaining records
+    """
+    global _listener, _handler
+
+    if _listener is None:
+        queue = Queue(-1)
+        _listener = QueueListener(queue, logging.StreamHandler())
+        _handler = QueueHandler(queue)
+        logger.addHandler(_handler)
+        logger.setLevel(logging.INFO)
+        _listener.start()
+
+    return _listener
+
+
+def stop_logging() -> None:
+    """
+    Flushes the remaining records and removes the handler added by setup_logging(),
+    so it can be set up again later.
+    """
+    global _listener, _handler
+
+    if _listener is None:
+        return
+
+    _listener.stop()
+    logger.removeHandler(_handler)
+    _listener = None
+    _handler = None
 
 
 class BatchImporter(object):
     """
     Batch importer for team and group memberships in eLabFTW.
+    Progress is logged to the "teamupload" logger, call setup_logging() to see it on the console.
 
     :param verify_ssl: Set to False if you use a self signed certificate. Also suppresses urllib3 warnings.
     :param debug: Set to True if you want to start the APIclient in dubug mode.
+    :param concurrency: Maximum number of (team, teamgroup) groups that are processed in parallel, and of parallel user and teamgroup lookups when reading from the server.
+    :param rate_limit: Maximum number of requests sent to the API per second.
+    :param max_retries: How often a request is retried if the API is rate limited (429) or unavailable (503).
+    :param user_lookup_threshold: Up to this number of emails users are looked up one by one instead of reading all users.
     """
 
-    def __init__(self, verify_ssl=True, debug=False) -> None:
+    def __init__(
+        self,
+        verify_ssl=True,
+        debug=False,
+        concurrency=8,
+        rate_limit=30,
+        max_retries=5,
+        user_lookup_threshold=50,
+    ) -> None:
         # Load environment variables
-        load_dotenv()
-        self.API_KEY = os.environ.get("ELAB_API_KEY")
-        self.API_HOST_URL = os.environ.get("ELAB_API_HOST_URL")
+        settings = read_settings()
+        self.API_KEY = settings.api_key
+        self.API_HOST_URL = settings.host
 
         # Configure the api client
         configuration = elabapi_python.Configuration()
@@ -35,23 +126,34 @@ class BatchImporter(object):
             header_name="Authorization", header_value=self.API_KEY
         )
 
+        # Create the api instances once, they are reused for every request
+        self._teams_api = elabapi_python.TeamsApi(self.api_client)
+        self._teamgroups_api = elabapi_python.TeamgroupsApi(self.api_client)
+
         # Supress ssl warnings
         if not verify_ssl:
             import urllib3
 
             urllib3.disable_warnings()
 
+        self.verify_ssl = verify_ssl
+        self.concurrency = concurrency
+        self.rate_limit = rate_limit
+        self.max_retries = max_retries
+        self.user_lookup_threshold = user_lookup_threshold
+        self.limiter = None
+        self.userlist = None
+        self.unresolved = None
         self.users_to_modify = None
 
     def read_excel(self, f: str, columnmap: dict = None) -> None:
         """
-        Reads the content of an xlsx file
+        Reads the content of an xlsx file.
+        Raises pandera.errors.SchemaErrors with all invalid values if the content doesn't match USERLIST_SCHEMA.
 
         :param f: filename of the file to read
         :param columnmap: dict of the column titles if different from default
         """
-        userlist = pd.read_excel(f, index_col=None, na_values=["NA"])
-
         # Map the column titles from human readable in the XLSX to machine-readable ones
         if not columnmap:
             columnmap = {
@@ -62,57 +164,243 @@ class BatchImporter(object):
                 "Gruppe": "teamgroup",
             }
 
+        # Only read the mapped columns, all values are read as strings
+        userlist = pd.read_excel(
+            f,
+            engine="calamine",
+            usecols=list(columnmap.keys()),
+            dtype=str,
+            index_col=None,
+            na_values=["NA"],
+        )
+
         userlist = userlist.rename(columns=dict(columnmap))
 
-        userlist = userlist.apply(lambda x: x.str.strip() if x.dtype == "object" else x)
+        # Strip the columns in place instead of building a new DataFrame,
+        # cells that only contain whitespace are treated as empty
+        for column in columnmap.values():
+            userlist[column] = userlist[column].str.strip().replace("", pd.NA)
+
+        # Rows without email or team can't be processed
+        incomplete = userlist["email"].isna() | userlist["team"].isna()
+        if incomplete.any():
+            # Row numbers as shown in the spreadsheet, below the header row
+            logger.warning(
+                "Skipped rows without email or team: %s",
+                ", ".join(str(index + 2) for index in userlist.index[incomplete]),
+            )
+            userlist = userlist.dropna(subset=["email", "team"])
+
+        # Fail before any request is sent if the content is invalid
+        USERLIST_SCHEMA.validate(userlist, lazy=True)
+
+        # Rows that occur more than once would only lead to repeated requests
+        self.userlist = userlist.drop_duplicates(subset=["email", "team", "teamgroup"])
+        if len(self.userlist) < len(userlist):
+            logger.info("Skipped %s duplicate rows", len(userlist) - len(self.userlist))
+
+    def resolve_ids(self, raise_not_found: bool = False) -> None:
+        """
+        Resolves the ids of users, teams and teamgroups of the userlist in one pass.
+        Rows that could not be resolved are reported, stored in self.unresolved and
+        not processed. Rows without teamgroup are kept with teamgroup_id None and only
+        added to the team. Users, teams and teamgroups must have been read from the
+        server before.
+
+        :param raise_not_found: raise a NotFoundException with all unresolved rows
+            after the resolved rows have been stored in users_to_modify
+        """
+        userlist = self.userlist
+        userlist["user_id"] = userlist["email"].map(self.find_userid_by_email)
+        userlist["team_id"] = userlist["team"].map(self.find_teamid_by_name)
+        userlist["teamgroup_id"] = [
+            self.find_teamgroupid_by_names(team, teamgroup)
+            for team, teamgroup in zip(userlist["team"], userlist["teamgroup"])
+        ]
+
+        unresolved = (
+            userlist["user_id"].isna()
+            | userlist["team_id"].isna()
+            | (userlist["teamgroup"].notna() & userlist["teamgroup_id"].isna())
+        )
+
+        self.unresolved = userlist[unresolved]
+
+        messages = []
+        for user in self.unresolved.itertuples(index=False):
+            if pd.isna(user.user_id):
+                messages.append(f"User with email {user.email} not found on server.")
+            elif pd.isna(user.team_id):
+                messages.append(
+                    f"Team with name {user.team} for user {user.email} not found on server."
+                )
+            else:
+                messages.append(
+                    f"Teamgroup {user.teamgroup} in team {user.team} for user {user.email} not found on server."
+                )
+
+        if messages:
+            logger.warning(
+                "The following rows could not be mapped and are skipped:\n%s",
+                "\n".join(messages),
+            )
+
+        resolved = userlist[~unresolved].astype({"user_id": int, "team_id": int})
+        resolved["teamgroup_id"] = pd.Series(
+            [
+                None if pd.isna(teamgroup_id) else int(teamgroup_id)
+                for teamgroup_id in resolved["teamgroup_id"]
+            ],
+            index=resolved.index,
+            dtype=object,
+        )
+
+        # Convert the resolved rows into a list of named tuples
+        self.users_to_modify = list(resolved.itertuples(index=False, name="Row"))
 
-        # Convert the userlist into a directory
-        self.users_to_modify = userlist.to_dict("records")
+        if messages and raise_not_found:
+            raise NotFoundException("\n".join(messages))
 
-    def read_users_from_server(self) -> dict:
+    async def read_users_from_server(self, emails: list = None) -> dict:
         """
         Reads users from API
 
+        :param emails: only read the users with these emails, if not more than user_lookup_threshold
+
         :return dict of of users with email as key
         """
-        users = elabapi_python.UsersApi(self.api_client).read_users()
+        if emails is not None and len(emails) <= self.user_lookup_threshold:
+            users = await self.fetch_users_by_email(emails)
+        else:
+            users = await asyncio.to_thread(self.request_users)
 
-        self.users_by_email = {
-            user.email: {"id": user.userid, "data": user} for user in users
-        }
+        self.users_by_email = {user.email: user for user, _ in users}
+
+        # Ids of the teams each user is already member of
+        self.user_team_ids = {user.userid: team_ids for user, team_ids in users}
 
         return self.users_by_email
 
-    def read_teams_from_server(self) -> dict:
+    def request_users(self, query_params: list = None) -> list:
+        """
+        Reads users from API including their team memberships.
+        The Users model of the generated api client has no teams, so the response
+        is read without the client's deserialization.
+
+        :param query_params: list of (name, value) tuples added to the request
+
+        :return list of tuples with user and frozenset of team ids
+        """
+        response = self.api_client.call_api(
+            "/users",
+            "GET",
+            query_params=query_params or [],
+            header_params={"Accept": "application/json"},
+            auth_settings=["token"],
+            _return_http_data_only=True,
+            _preload_content=False,
+        )
+
+        users = []
+        for data in json.loads(response.data):
+            user = elabapi_python.Users(
+                **{
+                    attr: data.get(key)
+                    for attr, key in elabapi_python.Users.attribute_map.items()
+                }
+            )
+            teams = data.get("teams") or []
+            if isinstance(teams, str):
+                teams = json.loads(teams)
+            users.append((user, frozenset(team["id"] for team in teams)))
+
+        return users
+
+    async def fetch_users_by_email(self, emails: list) -> list:
+        """
+        Searches the users by email concurrently, limited by the configured concurrency.
+
+        :param emails: list of emails
+
+        :return list of tuples with user and frozenset of team ids
+        """
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def _fetch(email: str) -> list:
+            async with semaphore:
+                found = await asyncio.to_thread(self.request_users, [("q", email)])
+            # The search also matches parts of names and emails
+            return [(user, team_ids) for user, team_ids in found if user.email == email]
+
+        results = await asyncio.gather(*(_fetch(email) for email in emails))
+
+        return [user for found in results for user in found]
+
+    async def read_teams_from_server(self) -> dict:
         """
         Reads teams from API
 
         :return dict of teams with name (str) as key
         """
-        teams = elabapi_python.TeamsApi(self.api_client).read_teams()
+        teams = await asyncio.to_thread(self._teams_api.read_teams)
         self.teams_by_name = {
-            team_from_server.name: {"id": team_from_server.id, "data": team_from_server}
-            for team_from_server in teams
+            team_from_server.name: team_from_server for team_from_server in teams
         }
         return self.teams_by_name
 
-    def read_teamgroups_from_server(self) -> dict:
+    async def read_teamgroups_from_server(self) -> dict:
         """
         Reads teamgroups from API
 
         :return dict of teams with teamgroups and names (str) as keys
         """
-        teamgroups = elabapi_python.TeamgroupsApi(self.api_client)
-        self.teamgroups_by_name = {}
+        self.teamgroups_by_name = await self.fetch_teamgroups()
 
-        for k, v in self.teams_by_name.items():
-            self.teamgroups_by_name[k] = {
-                teamgroup.name: teamgroup
-                for teamgroup in teamgroups.read_team_teamgroups(v.get("id"))
+        # Collect the ids of the members once, so membership checks don't iterate the users
+        self.teamgroup_member_ids = {
+            team: {
+                name: frozenset(user.userid for user in teamgroup.users)
+                for name, teamgroup in teamgroups.items()
             }
+            for team, teamgroups in self.teamgroups_by_name.items()
+        }
 
         return self.teamgroups_by_name
 
+    async def fetch_teamgroups(self) -> dict:
+        """
+        Fetches the teamgroups of all teams concurrently, limited by the configured concurrency.
+        The generated api client is synchronous, so each request runs in its own thread.
+
+        :return dict of teams with teamgroups and names (str) as keys
+        """
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def _fetch(team_id: int) -> list:
+            async with semaphore:
+                return await asyncio.to_thread(
+                    self._teamgroups_api.read_team_teamgroups, team_id
+                )
+
+        results = await asyncio.gather(
+            *(_fetch(v.id) for v in self.teams_by_name.values())
+        )
+
+        return {
+            k: {teamgroup.name: teamgroup for teamgroup in result}
+            for k, result in zip(self.teams_by_name, results)
+        }
+
+    async def refresh_caches(self, emails: list = None) -> None:
+        """
+        Reads users, teams and teamgroups from API
+
+        :param emails: only read the users with these emails, see read_users_from_server
+        """
+        await self.read_users_from_server(emails)
+        await self.read_teams_from_server()
+        await self.read_teamgroups_from_server()
+
     def find_userid_by_email(self, email: str) -> int:
         """
         Get the user id by email
@@ -126,7 +414,7 @@ class BatchImporter(object):
         if not user:
             return None
 
-        return user.get("id")
+        return user.userid
 
     def find_teamid_by_name(self, teamname: str) -> int:
         """
@@ -141,7 +429,7 @@ class BatchImporter(object):
         if not team:
             return None
 
-        return team.get("id")
+        return team.id
 
     def find_teamgroupid_by_names(self, teamname: str, teamgroupname: str):
         """
@@ -152,160 +440,258 @@ class BatchImporter(object):
 
         :return int
         """
-        teamgroup = self.teamgroups_by_name.get(teamname).get(teamgroupname)
+        teamgroup = self.teamgroups_by_name.get(teamname, {}).get(teamgroupname)
 
         if not teamgroup:
             return None
 
         return teamgroup.id
 
-    def add_user_to_team(self, email:str, team:str) -> object:
+    async def patch(
+        self, client: httpx.AsyncClient, url: str, body: dict
+    ) -> httpx.Response:
         """
-        Add a user to a team
+        Send a rate limited PATCH request. Requests that are answered with 429 or 503
+        are retried after the time given in the Retry-After header or with exponential backoff.
+        Requests that fail with a transport error are retried with exponential backoff,
+        the last error is raised.
 
-        :param email: email of the user
-        :param team: name of the team
+        :param client: httpx client used to send the request
+        :param url: url of the resource relative to the api host url
+        :param body: dict that is sent as json body
 
-        :return Updated user
+        :return Response
         """
-        if not email or not team:
-            raise ValueError("Email and Team must to be set")
+        for attempt in range(self.max_retries + 1):
+            try:
+                async with self.limiter:
+                    response = await client.patch(url, json=body)
+            except httpx.TransportError as err:
+                if attempt == self.max_retries:
+                    raise
+
+                reason = repr(err)
+                retry_after = ""
+            else:
+                if (
+                    response.status_code not in (429, 503)
+                    or attempt == self.max_retries
+                ):
+                    return response
+
+                reason = response.status_code
+                retry_after = response.headers.get("Retry-After", "")
+
+            if retry_after.isdigit():
+                delay = int(retry_after)
+            else:
+                delay = min(30, 0.5 * 2**attempt) + random.random() * 0.5
+
+            logger.warning(
+                "Request to %s failed with %s - retrying in %s seconds",
+                url,
+                reason,
+                delay,
+            )
+            await asyncio.sleep(delay)
 
-        user_id = self.find_userid_by_email(email)
-        team_id = self.find_teamid_by_name(team)
+    async def add_user_to_team(self, client: httpx.AsyncClient, user: tuple) -> object:
+        """
+        Add a user to a team
 
-        if not user_id:
-            raise NotFoundException(f"User with email {email} not found on server.\n")
+        :param client: httpx client used to send the request
+        :param user: row of the userlist with resolved user_id and team_id
 
-        if not team_id:
-            raise NotFoundException(f"Team with name {team} not found on server.\n")
+        :return Updated user
+        """
+        # At the moment the api throws an error if you want add an user to a team
+        # when the user is already member of that team. This will be adressed in a future update.
+        # For more details see https://github.com/elabftw/elabftw/issues/4192#issuecomment-1458222167
+        # Known memberships are therefore skipped without a request.
+        if user.team_id in self.user_team_ids.get(user.user_id, ()):
+            logger.info(
+                "User %s is already in team %s - Skipped to teamgroup.",
+                user.email,
+                user.team,
+            )
+            return None
 
         try:
-            # At the moment the api throws an error if you want add an user to a team
-            # when the user is already member of that team. This will be adressed in a future update.
-            # For more details see https://github.com/elabftw/elabftw/issues/4192#issuecomment-1458222167
-            updated = elabapi_python.UsersApi(self.api_client).patch_user(
-                user_id, body={"action": "add", "team": team_id}
+            response = await self.patch(
+                client,
+                f"/users/{user.user_id}",
+                {"action": "add", "team": user.team_id},
             )
-            print("User ", email, "added to team", team, "with team id", team_id)
-        except ApiException as err:
-            print(
-                "While processing",
-                email,
-                "with team",
-                team,
-                "the API raised an",
-                err.reason,
+        except httpx.TransportError as err:
+            logger.warning(
+                "While processing %s with team %s the request failed: %r",
+                user.email,
+                user.team,
+                err,
             )
-            print("Propably the user is already in that team. ")
-            updated = None
+            return None
+
+        if not response.is_success:
+            logger.warning(
+                "While processing %s with team %s the API raised an %s. "
+                "Propably the user is already in that team.",
+                user.email,
+                user.team,
+                response.reason_phrase,
+            )
+            return None
+
+        updated = response.json()
+
+        logger.info(
+            "User %s added to team %s with team id %s",
+            user.email,
+            user.team,
+            user.team_id,
+        )
 
         return updated
 
-    def add_user_to_teamgroup(self, email: str, team: str, teamgroup: str) -> object:
+    async def add_user_to_teamgroup(
+        self, client: httpx.AsyncClient, user: tuple
+    ) -> object:
         """
         Add a user to a teamgroup
 
-        :param email: email of the user
-        :param team: name of the team
-        :param teamgroup name of the teamgroup
+        :param client: httpx client used to send the request
+        :param user: row of the userlist with resolved user_id, team_id and teamgroup_id
 
         :return Updated teamgroup
         """
-        if not email or not team or not teamgroup:
-            raise ValueError("Email, Team and Teamgroup must to be set")
-
-        user_id = self.find_userid_by_email(email)
-        team_id = self.find_teamid_by_name(team)
-        teamgroup_id = self.find_teamgroupid_by_names(team, teamgroup)
-
-        if not user_id:
-            raise NotFoundException(f"User with email {email} not found on server.\n")
+        if user.teamgroup_id is None:
+            return None
 
-        if not team_id:
-            raise NotFoundException(
-                f"Team with name {team} for user {email} not found on server.\n"
+        if user.user_id in self.teamgroup_member_ids[user.team][user.teamgroup]:
+            logger.info(
+                "User %s is already in teamgroup %s - Skipped to next record.",
+                user.email,
+                user.teamgroup,
             )
+            return None
 
-        if not teamgroup_id:
-            raise NotFoundException(
-                f"Teamgroup {teamgroup} in team {team} for user {email} not found on server.\n"
+        try:
+            response = await self.patch(
+                client,
+                f"/teams/{user.team_id}/teamgroups/{user.teamgroup_id}",
+                {"how": "add", "userid": user.user_id},
             )
+        except httpx.TransportError as err:
+            logger.warning(
+                "While processing %s with teamgroup %s the request failed: %r",
+                user.email,
+                user.teamgroup,
+                err,
+            )
+            return None
 
-        groupmembers = [
-            user.userid
-            for user in self.teamgroups_by_name.get(team).get(teamgroup).users
-        ]
-
-        if user_id in groupmembers:
-            print(
-                "User",
-                email,
-                "is already in teamgroup",
-                teamgroup,
-                "- Skipped to next record.",
+        if not response.is_success:
+            logger.warning(
+                "While processing %s with teamgroup %s the API raised an %s.",
+                user.email,
+                user.teamgroup,
+                response.reason_phrase,
             )
             return None
 
-        updated = elabapi_python.TeamgroupsApi(self.api_client).patch_teamgroup(
-            team_id,
-            teamgroup_id,
-            body={"how": "add", "userid": user_id},
-        )
-        print(
-            "User ",
-            email,
-            "added to teamgroup",
-            teamgroup,
-            "with teamgroup id",
-            teamgroup_id,
-            "in team",
-            team,
+        updated = response.json()
+
+        logger.info(
+            "User %s added to teamgroup %s with teamgroup id %s in team %s",
+            user.email,
+            user.teamgroup,
+            user.teamgroup_id,
+            user.team,
         )
 
         return updated
 
-    def process(self, filename: str) -> None:
+    async def process_users(self) -> None:
         """
-        Process the excel file and run the import
+        Add all users read from the excel file to their teams and teamgroups.
+        Users of the same team and teamgroup are processed one after another, so the
+        server sees consecutive writes to the same team. Different teamgroups are
+        processed concurrently, limited by the configured concurrency.
+        A sheet where all users are in the same teamgroup is therefore processed serially.
+        """
+        semaphore = asyncio.Semaphore(self.concurrency)
+        self.limiter = AsyncLimiter(self.rate_limit, 1.0)
+
+        # Over HTTP/2 the concurrent requests share one connection
+        async with httpx.AsyncClient(
+            base_url=self.API_HOST_URL,
+            http2=True,
+            headers={"Authorization": self.API_KEY},
+            verify=self.verify_ssl,
+            limits=httpx.Limits(max_connections=self.concurrency),
+        ) as client:
+            # Users listed with several teamgroups of the same team are added to the team only once
+            team_additions = {}
+
+            # The API has no endpoint to add several users at once, so the
+            # requests of a group are sent back to back. A batch endpoint
+            # would replace the loop in _handle_group.
+            groups = {}
+            for user in self.users_to_modify:
+                groups.setdefault((user.team_id, user.teamgroup_id), []).append(user)
+
+            async def _handle_group(users: list) -> None:
+                async with semaphore:
+                    for user in users:
+                        logger.info(
+                            'Now processing user "%s %s" identified by email "%s"',
+                            user.firstname,
+                            user.lastname,
+                            user.email,
+                        )
+                        key = (user.user_id, user.team_id)
+                        if key not in team_additions:
+                            team_additions[key] = asyncio.create_task(
+                                self.add_user_to_team(client, user)
+                            )
+                        # An error only skips this user, the rest of the group continues
+                        try:
+                            await team_additions[key]
+                            await self.add_user_to_teamgroup(client, user)
+                        except Exception:
+                            logger.exception(
+                                "Processing user %s failed - Skipped to next record.",
+                                user.email,
+                            )
+
+            await asyncio.gather(*(_handle_group(users) for users in groups.values()))
+
+    async def run(self, filename: str) -> None:
+        """
+        Process the excel file and run the import. Use this instead of process
+        if an event loop is already running, e.g. in Jupyter.
 
         :param filename: name of the excel file that will be imported
 
         """
-        print(" #####", "\n", "\n", "Read data from ", self.API_HOST_URL)
-        self.read_users_from_server()
-        self.read_teams_from_server()
-        self.read_teamgroups_from_server()
-
-        print(" *****", "\n", "\n", "Start processing file ", filename)
+        logger.info("Start processing file %s", filename)
         self.read_excel(filename)
 
-        for user in self.users_to_modify:
-            print(
-                "\n",
-                "*****",
-                "\n",
-                "\n",
-                'Now processing user "',
-                user["firstname"],
-                user["lastname"],
-                '" identified by email "',
-                user["email"],
-                '"',
-            )
-            try:
-                self.add_user_to_team(user["email"], user["team"])
-                self.add_user_to_teamgroup(user["email"], user["team"], user["teamgroup"])
-            except NotFoundException as e:
-                # Log error to console if user not found
-                print(str(e))
+        logger.info("Read data from %s", self.API_HOST_URL)
+        await self.refresh_caches(emails=list(self.userlist["email"].dropna().unique()))
+        self.resolve_ids()
 
+        await self.process_users()
 
-        print("\n", "Processing completed", "\n", "\n", "#####")
+        logger.info("Processing completed")
 
-        self.read_users_from_server()
-        self.read_teams_from_server()
-        self.read_teamgroups_from_server()
+    def process(self, filename: str) -> None:
+        """
+        Process the excel file and run the import
+
+        :param filename: name of the excel file that will be imported
+
+        """
+        asyncio.run(self.run(filename))
 
 
 class NotFoundException(Exception):
@@ -321,5 +707,9 @@ class NotFoundException(Exception):
 
 
 if __name__ == "__main__":
-    importer = BatchImporter(verify_ssl=False)
-    importer.process("userlist.xlsx")
+    setup_logging()
+    try:
+        importer = BatchImporter(verify_ssl=False)
+        importer.process("userlist.xlsx")
+    finally:
+        stop_logging()